@@ -15,6 +15,9 @@ from keboola.component.base import ComponentBase, sync_action
 from keboola.component.exceptions import UserException
 
 from configuration import AuthEnum, Configuration, SourceEnum, VenvEnum, encrypted_keys
+from home_cache import HomeCache
+from metrics_channel import MetricsChannel
+from output_compactor import OutputCompactor
 from package_installer import PackageInstaller
 from source_file import FileHandler
 from source_git import GitHandler
@@ -56,6 +59,9 @@ class Component(ComponentBase):
         )
 
     def run(self):
+        # resolve before the working directory gets changed
+        tables_out_path = Path(self.tables_out_path).absolute()
+
         if self.parameters.source == SourceEnum.CODE:
             base_path = Path(self.data_folder_path)
             script_filename = FileHandler.prepare_script_file(self.data_folder_path, self.parameters.code)
@@ -82,7 +88,20 @@ class Component(ComponentBase):
 
         self._merge_user_parameters()
 
-        self.execute_script_file(script_filename)
+        home_cache = None
+        if self.parameters.cache.enabled:
+            home_cache = HomeCache(self.parameters.cache, self._get_cache_key())
+            home_cache.restore()
+
+        try:
+            self.execute_script_file(script_filename)
+        finally:
+            # keep the downloaded data even when the script fails later, so that retries don't download it again
+            if home_cache:
+                home_cache.save()
+
+        if self.parameters.output_compaction.enabled:
+            OutputCompactor(tables_out_path, self.parameters.output_compaction).compact()
 
     def execute_script_file(self, file_path: Path):
         # Change current working directory so that relative paths work
@@ -94,7 +113,8 @@ class Component(ComponentBase):
                 script = file.read()
             logging.info("Executing script:\n%s", self.script_excerpt(script))
             args = ["uv", "run", str(file_path)]
-            SubprocessRunner.run(args, "Script executed successfully.", "Script execution failed.")
+            with MetricsChannel():
+                SubprocessRunner.run(args, "Script executed successfully.", "Script execution failed.")
         except UserException:
             raise
         except Exception as err:
@@ -143,6 +163,14 @@ class Component(ComponentBase):
         with open(Path(self.data_folder_path) / "config.json", "w+") as inp:
             json.dump(config_data, inp)
 
+    def _get_cache_key(self) -> str:
+        """
+        Returns the key separating cached data of individual configurations.
+        """
+        project_id = self.environment_variables.project_id or "local"
+        config_id = self.environment_variables.config_id or "local"
+        return f"{project_id}-{config_id}"
+
     @sync_action("listBranches")
     def get_repository_branches(self):
         """
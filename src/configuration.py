@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 from enum import Enum
+from pathlib import Path
 
 from keboola.component.exceptions import UserException
 
@@ -47,6 +48,51 @@ class GitConfiguration:
     auth: AuthEnum = AuthEnum.NONE
     encrypted_token: str | None = None
     ssh_keys: SSHKeysConfiguration = field(default_factory=SSHKeysConfiguration)
+    submodules: bool = False
+    submodule_jobs: int = 4
+    lfs: bool = False
+    lfs_include: list[str] = field(default_factory=list)
+    lfs_exclude: list[str] = field(default_factory=list)
+    lfs_concurrent_transfers: int = 8
+
+
+@dataclass
+class OutputCompactionConfiguration:
+    enabled: bool = False
+    min_size_mb: int = 1024
+    slice_size_mb: int = 256
+    compression_level: int = 6
+    max_workers: int = 0  # 0 = number of CPU cores
+
+    def __post_init__(self):
+        if self.min_size_mb < 0:
+            raise UserException("Invalid output_compaction.min_size_mb: must not be negative")
+        if self.slice_size_mb <= 0:
+            raise UserException("Invalid output_compaction.slice_size_mb: must be a positive number")
+        if not 0 <= self.compression_level <= 9:
+            raise UserException("Invalid output_compaction.compression_level: must be between 0 and 9")
+        if self.max_workers < 0:
+            raise UserException("Invalid output_compaction.max_workers: must not be negative")
+
+
+@dataclass
+class CacheConfiguration:
+    enabled: bool = False
+    path: str = ""
+    # directories relative to $HOME where packages like huggingface, torch, stanza or nltk cache their data
+    directories: list[str] = field(
+        default_factory=lambda: [".cache/huggingface", ".cache/torch", "stanza_resources", "nltk_data"]
+    )
+    max_size_mb: int = 5120
+
+    def __post_init__(self):
+        if self.max_size_mb <= 0:
+            raise UserException("Invalid cache.max_size_mb: must be a positive number")
+        if self.enabled and not Path(self.path).is_absolute():
+            raise UserException("Invalid cache.path: absolute path of the persistent cache location is required")
+        for directory in self.directories:
+            if Path(directory).is_absolute() or ".." in Path(directory).parts:
+                raise UserException(f"Invalid cache directory '{directory}': must be relative to the home directory")
 
 
 @dataclass
@@ -57,6 +103,8 @@ class Configuration:
     packages: list[str] = field(default_factory=list)
     code: str = ""
     git: GitConfiguration = field(default_factory=GitConfiguration)
+    output_compaction: OutputCompactionConfiguration = field(default_factory=OutputCompactionConfiguration)
+    cache: CacheConfiguration = field(default_factory=CacheConfiguration)
 
     def __post_init__(self):
         if isinstance(self.user_properties, list):
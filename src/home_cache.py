@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from configuration import CacheConfiguration
+
+MB = 1024 * 1024
+COPY_CHUNK_SIZE = MB
+INDEX_FILE = "index.json"
+DATA_DIR = "data"
+TMP_ENTRY_SUFFIX = ".tmp-"
+
+
+class CorruptedCacheError(Exception):
+    pass
+
+
+class HomeCache:
+    """
+    Persists data downloaded by the user script into $HOME (ML models, NLP resources, ...) between runs.
+
+    Every cached directory is stored as a separate entry in `<cache path>/<config key>/<directory>/`:
+    the copied files in `data/` and `index.json` with their SHA-256 checksums and the last usage time.
+    Entries are verified when restored, saved back only when the directory content changed and the least
+    recently used ones are evicted once the cache of the configuration exceeds the size limit. Other
+    configurations sharing the cache location are never touched.
+
+    The cache is best effort only – any failure is logged and the affected entry is skipped.
+    """
+
+    def __init__(self, cfg: CacheConfiguration, cache_key: str):
+        self.cfg = cfg
+        self.home = Path.home()
+        self.cache_root = Path(cfg.path)
+        self.key_path = self.cache_root / self._slugify(cache_key)
+        self._indexes: dict[str, dict] = {}
+        self._snapshots: dict[str, dict[str, tuple]] = {}
+
+    def restore(self) -> None:
+        for directory in self.cfg.directories:
+            entry = self._entry_path(directory)
+            target = self.home / directory
+            try:
+                index = self._read_index(entry)
+                if index:
+                    started = time.monotonic()
+                    self._restore_files(entry / DATA_DIR, target, index["files"])
+                    index["last_used"] = time.time()
+                    self._write_index(entry, index)
+                    self._indexes[directory] = index
+                    logging.info(
+                        "Restored cached %s (%.1f MB) in %.1f s.",
+                        directory,
+                        index["size"] / MB,
+                        time.monotonic() - started,
+                    )
+            except (CorruptedCacheError, OSError, ValueError, KeyError) as e:
+                logging.warning("Discarding cached %s, it cannot be restored: %s", directory, e)
+                shutil.rmtree(entry, ignore_errors=True)
+            self._snapshots[directory] = self._snapshot(target)
+
+    def save(self) -> None:
+        for directory in self.cfg.directories:
+            source = self.home / directory
+            entry = self._entry_path(directory)
+            snapshot = self._snapshot(source)
+            if snapshot == self._snapshots.get(directory, {}):
+                continue
+
+            if not snapshot:
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+
+            size = sum(stat[0] for stat in snapshot.values() if stat[0] != "symlink")
+            if size > self.cfg.max_size_mb * MB:
+                logging.warning(
+                    "Not caching %s, its size %.1f MB exceeds the cache limit of %d MB.",
+                    directory,
+                    size / MB,
+                    self.cfg.max_size_mb,
+                )
+                continue
+
+            try:
+                started = time.monotonic()
+                self._save_entry(directory, source, snapshot, size)
+                logging.info("Saved %s to cache (%.1f MB) in %.1f s.", directory, size / MB, time.monotonic() - started)
+            except OSError as e:
+                logging.warning("Failed to save %s to cache: %s", directory, e)
+
+        self._evict()
+
+    def _save_entry(self, directory: str, source: Path, snapshot: dict[str, tuple], size: int) -> None:
+        """Write the entry into a temporary folder first, files unchanged since restore are hard linked."""
+        entry = self._entry_path(directory)
+        previous_files = self._indexes.get(directory, {}).get("files", {})
+        previous_snapshot = self._snapshots.get(directory, {})
+
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        # unique name, concurrent runs of the same configuration may share the cache location
+        tmp_entry = Path(tempfile.mkdtemp(dir=entry.parent, prefix=f"{entry.name}{TMP_ENTRY_SUFFIX}"))
+        try:
+            files = {}
+            for rel_path, stat in snapshot.items():
+                src = source / rel_path
+                dst = tmp_entry / DATA_DIR / rel_path
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if stat[0] == "symlink":
+                    os.symlink(stat[1], dst)
+                    files[rel_path] = {"symlink": stat[1]}
+                elif previous_snapshot.get(rel_path) == stat and "sha256" in previous_files.get(rel_path, {}):
+                    self._link_or_copy(entry / DATA_DIR / rel_path, dst)
+                    files[rel_path] = previous_files[rel_path]
+                else:
+                    files[rel_path] = {"size": stat[0], "sha256": self._copy_file(src, dst)}
+
+            index = {"directory": directory, "files": files, "size": size, "last_used": time.time()}
+            self._write_index(tmp_entry, index)
+            shutil.rmtree(entry, ignore_errors=True)
+            tmp_entry.rename(entry)
+        except BaseException:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            raise
+
+    def _restore_files(self, data_path: Path, target: Path, files: dict[str, dict]) -> None:
+        """
+        Restore the whole entry into a staging folder next to the target first and move it into place only
+        once every file passed the checksum verification, so that an incomplete entry never ends up in $HOME.
+        """
+        staging = target.with_name(f".{target.name}.cache-restore")
+        shutil.rmtree(staging, ignore_errors=True)
+        try:
+            for rel_path, meta in files.items():
+                dst = staging / rel_path
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if "symlink" in meta:
+                    os.symlink(meta["symlink"], dst)
+                elif self._copy_file(data_path / rel_path, dst) != meta["sha256"]:
+                    raise CorruptedCacheError(f"checksum mismatch of {rel_path}")
+
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                staging.rename(target)
+                return
+
+            for rel_path in files:
+                dst = target / rel_path
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                if dst.is_symlink() or dst.is_file():
+                    dst.unlink()
+                os.replace(staging / rel_path, dst)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries of this configuration until they fit the size limit."""
+        entries = []
+        for index_path in self.key_path.glob(f"*/{INDEX_FILE}"):
+            if TMP_ENTRY_SUFFIX in index_path.parent.name:
+                continue
+            try:
+                index = self._read_index(index_path.parent)
+                entries.append((index.get("last_used", 0), index.get("size", 0), index_path.parent))
+            except (OSError, ValueError):
+                entries.append((0, 0, index_path.parent))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.cfg.max_size_mb * MB:
+                break
+            logging.info("Evicting cache entry %s (%.1f MB).", entry.relative_to(self.cache_root), size / MB)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def _entry_path(self, directory: str) -> Path:
+        return self.key_path / self._slugify(directory)
+
+    @staticmethod
+    def _snapshot(path: Path) -> dict[str, tuple]:
+        """Map relative file paths to (size, mtime) or ("symlink", target) to detect changes cheaply."""
+        snapshot = {}
+        if not path.is_dir():
+            return snapshot
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in dirnames + filenames:
+                full_path = Path(dirpath) / name
+                rel_path = str(full_path.relative_to(path))
+                if full_path.is_symlink():
+                    snapshot[rel_path] = ("symlink", os.readlink(full_path))
+                elif full_path.is_file():
+                    stat = full_path.stat()
+                    snapshot[rel_path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    @staticmethod
+    def _copy_file(src: Path, dst: Path) -> str:
+        """Copy the file preserving its metadata and return the SHA-256 checksum of the copied content."""
+        digest = hashlib.sha256()
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            while chunk := fin.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+                fout.write(chunk)
+        shutil.copystat(src, dst)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path) -> None:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def _read_index(entry: Path) -> dict | None:
+        index_path = entry / INDEX_FILE
+        if not index_path.is_file():
+            return None
+        with open(index_path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_index(entry: Path, index: dict) -> None:
+        entry.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry / f"{INDEX_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, entry / INDEX_FILE)
+
+    @staticmethod
+    def _slugify(value: str) -> str:
+        return re.sub(r"[^A-Za-z0-9._-]+", "_", value.strip("/")) or "_"
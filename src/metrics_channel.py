@@ -0,0 +1,173 @@
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+METRICS_SOCKET_ENV = "KBC_METRICS_SOCKET"
+CLIENT_LIB_PATH = Path(__file__).parent / "script_lib"
+SNAPSHOT_INTERVAL = 60
+RECEIVE_TIMEOUT = 0.5
+DRAIN_TIMEOUT = 5
+MAX_DATAGRAM_SIZE = 65536
+MAX_METRICS = 1000
+
+
+class MetricsAggregator:
+    """Aggregates counters, gauges and timers received as StatsD-like lines (`name:value|type`)."""
+
+    def __init__(self):
+        self.counters: dict[str, float] = {}
+        self.gauges: dict[str, dict[str, float]] = {}
+        self.timers: dict[str, dict[str, float]] = {}
+        self.dropped = 0
+        self.version = 0
+
+    def add_payload(self, payload: str) -> None:
+        for line in payload.splitlines():
+            if line:
+                self.add_line(line)
+
+    def add_line(self, line: str) -> None:
+        metric, _, metric_type = line.rpartition("|")
+        name, _, raw_value = metric.rpartition(":")
+        try:
+            value = float(raw_value)
+        except ValueError:
+            self.dropped += 1
+            return
+
+        if not name or metric_type not in ("c", "g", "ms") or not self._has_capacity(name):
+            self.dropped += 1
+            return
+
+        if metric_type == "c":
+            self.counters[name] = self.counters.get(name, 0) + value
+        elif metric_type == "g":
+            gauge = self.gauges.setdefault(name, {"last": value, "min": value, "max": value})
+            gauge["last"] = value
+            gauge["min"] = min(gauge["min"], value)
+            gauge["max"] = max(gauge["max"], value)
+        else:
+            timer = self.timers.setdefault(name, {"count": 0, "sum": 0, "min": value, "max": value})
+            timer["count"] += 1
+            timer["sum"] += value
+            timer["min"] = min(timer["min"], value)
+            timer["max"] = max(timer["max"], value)
+        self.version += 1
+
+    def _has_capacity(self, name: str) -> bool:
+        """Limit the number of distinct metrics to keep the memory bounded."""
+        if name in self.counters or name in self.gauges or name in self.timers:
+            return True
+        return len(self.counters) + len(self.gauges) + len(self.timers) < MAX_METRICS
+
+    def snapshot(self) -> dict:
+        timers = {name: {**t, "avg": t["sum"] / t["count"]} for name, t in self.timers.items()}
+        return {
+            "counters": dict(self.counters),
+            "gauges": {name: dict(g) for name, g in self.gauges.items()},
+            "timers": timers,
+            "dropped": self.dropped,
+        }
+
+    def format(self) -> str:
+        """Returns a compact single line representation of the current values."""
+        parts = [f"{name}={value:g}" for name, value in self.counters.items()]
+        parts.extend(f"{name}={g['last']:g}" for name, g in self.gauges.items())
+        parts.extend(
+            f"{name}={t['count']}x avg {t['sum'] / t['count']:.1f} ms (max {t['max']:.1f} ms)"
+            for name, t in self.timers.items()
+        )
+        if self.dropped:
+            parts.append(f"dropped={self.dropped}")
+        return ", ".join(parts)
+
+
+class MetricsChannel:
+    """
+    Side channel for metrics sent by the user script via the `kbc_metrics` client.
+
+    While active, a Unix datagram socket is bound in a temporary folder and its path is exposed in the
+    KBC_METRICS_SOCKET environment variable, together with the client library location in PYTHONPATH, so
+    that the subprocess started inside the `with` block inherits both. Received values are aggregated in
+    a background thread, a snapshot is logged periodically and a summary once the channel is closed.
+    """
+
+    def __init__(self, snapshot_interval: float = SNAPSHOT_INTERVAL):
+        self.snapshot_interval = snapshot_interval
+        self.aggregator = MetricsAggregator()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._previous_env: dict[str, str | None] = {}
+        self._drain_deadline = 0.0
+
+    def __enter__(self) -> "MetricsChannel":
+        self._tmp_dir = tempfile.mkdtemp(prefix="kbc-metrics-")
+        self.socket_path = os.path.join(self._tmp_dir, "metrics.sock")
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.socket_path)
+        self._socket.settimeout(RECEIVE_TIMEOUT)
+
+        self._previous_env = {key: os.environ.get(key) for key in (METRICS_SOCKET_ENV, "PYTHONPATH")}
+        os.environ[METRICS_SOCKET_ENV] = self.socket_path
+        python_path = [str(CLIENT_LIB_PATH), os.environ.get("PYTHONPATH")]
+        os.environ["PYTHONPATH"] = os.pathsep.join(p for p in python_path if p)
+
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        # the script has finished, so the receiver only drains what is left in the socket
+        self._drain_deadline = time.monotonic() + DRAIN_TIMEOUT
+        self._stop.set()
+        self._thread.join()
+        self._socket.close()
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        for key, value in self._previous_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+        with self._lock:
+            if self.aggregator.version:
+                logging.info(
+                    "Script metrics summary: %s",
+                    self.aggregator.format(),
+                    extra={"metrics": self.aggregator.snapshot()},
+                )
+
+    def _receive(self) -> None:
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        logged_version = 0
+        while True:
+            try:
+                payload = self._socket.recv(MAX_DATAGRAM_SIZE)
+                with self._lock:
+                    self.aggregator.add_payload(payload.decode(errors="replace"))
+            except socket.timeout:
+                if self._stop.is_set():
+                    return
+            except OSError as e:
+                logging.warning("Script metrics channel closed unexpectedly: %s", e)
+                return
+
+            # values still sent by processes left running in the background must not block the component
+            if self._stop.is_set() and time.monotonic() >= self._drain_deadline:
+                return
+
+            if time.monotonic() >= next_snapshot:
+                next_snapshot = time.monotonic() + self.snapshot_interval
+                with self._lock:
+                    if self.aggregator.version != logged_version:
+                        logged_version = self.aggregator.version
+                        logging.info(
+                            "Script metrics snapshot: %s",
+                            self.aggregator.format(),
+                            extra={"metrics": self.aggregator.snapshot()},
+                        )
@@ -0,0 +1,215 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import shutil
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from configuration import OutputCompactionConfiguration
+
+MB = 1024 * 1024
+READ_CHUNK_SIZE = MB
+SLICE_NAME_TEMPLATE = "part_{:05d}.csv.gz"
+
+
+@dataclass
+class CompactionResult:
+    table: str
+    original_bytes: int
+    compressed_bytes: int
+    slices: int
+
+
+class OutputCompactor:
+    """
+    Splits large output tables into gzipped slices, so that the platform uploads them faster.
+
+    The slices are compressed in a thread pool – zlib releases the GIL while deflating, so the work
+    is spread across all cores while each worker streams its byte range of the table in fixed-size chunks.
+    """
+
+    def __init__(self, tables_out_path: Path, cfg: OutputCompactionConfiguration):
+        self.tables_out_path = tables_out_path
+        self.cfg = cfg
+
+    def compact(self) -> list[CompactionResult]:
+        tables = self._find_large_tables()
+        if not tables:
+            logging.info("Output compaction: no output tables larger than %d MB found.", self.cfg.min_size_mb)
+            return []
+
+        started = time.monotonic()
+        results = []
+        failed = 0
+        for table_path in tables:
+            try:
+                result = self._compact_table(table_path)
+            except (OSError, UnicodeDecodeError, csv.Error, json.JSONDecodeError) as e:
+                logging.warning("Output table %s left uncompressed, compaction failed: %s", table_path.name, e)
+                failed += 1
+                continue
+            if result:
+                results.append(result)
+
+        original_bytes = sum(r.original_bytes for r in results)
+        compressed_bytes = sum(r.compressed_bytes for r in results)
+        logging.info(
+            "Output compaction finished in %.1f s: %d table(s) compacted, %d failed, "
+            "%.1f MB -> %.1f MB, saved %.1f MB.",
+            time.monotonic() - started,
+            len(results),
+            failed,
+            original_bytes / MB,
+            compressed_bytes / MB,
+            (original_bytes - compressed_bytes) / MB,
+        )
+        return results
+
+    def _find_large_tables(self) -> list[Path]:
+        if not self.tables_out_path.is_dir():
+            return []
+
+        min_size = self.cfg.min_size_mb * MB
+        return [
+            path
+            for path in sorted(self.tables_out_path.iterdir())
+            if path.is_file()
+            and not path.name.startswith(".")
+            and not path.name.endswith((".manifest", ".gz"))
+            and path.stat().st_size >= min_size
+        ]
+
+    def _compact_table(self, table_path: Path) -> CompactionResult | None:
+        manifest_path = table_path.with_name(table_path.name + ".manifest")
+        manifest = {}
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        delimiter = manifest.get("delimiter") or ","
+        enclosure = manifest.get("enclosure", '"') or ""
+        has_header = manifest.get("has_header", not (manifest.get("columns") or manifest.get("schema")))
+
+        # the slices must not contain the header, the columns are passed in the manifest instead
+        header = None
+        data_start = 0
+        if has_header:
+            data_start = next(self._record_boundaries(table_path, 0, 0, enclosure), table_path.stat().st_size)
+            with open(table_path, "rb") as f:
+                header_line = f.read(data_start).decode("utf-8-sig").rstrip("\r\n")
+            if enclosure:
+                header = next(csv.reader([header_line], delimiter=delimiter, quotechar=enclosure), [])
+            else:
+                header = next(csv.reader([header_line], delimiter=delimiter, quoting=csv.QUOTE_NONE), [])
+
+        size = table_path.stat().st_size
+        step = self.cfg.slice_size_mb * MB
+        bounds = [data_start]
+        bounds.extend(b for b in self._record_boundaries(table_path, data_start, step, enclosure) if b < size)
+        bounds.append(size)
+        ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+        if not ranges:
+            return None
+
+        logging.info(
+            "Compacting output table %s (%.1f MB) into %d slice(s)...", table_path.name, size / MB, len(ranges)
+        )
+
+        slices_dir = table_path.with_name(f".{table_path.name}.slices")
+        shutil.rmtree(slices_dir, ignore_errors=True)
+        slices_dir.mkdir()
+        try:
+            with ThreadPoolExecutor(max_workers=self.cfg.max_workers or os.cpu_count()) as executor:
+                futures = [
+                    executor.submit(
+                        self._compress_range, table_path, start, end, slices_dir / SLICE_NAME_TEMPLATE.format(i)
+                    )
+                    for i, (start, end) in enumerate(ranges)
+                ]
+                compressed_sizes = [future.result() for future in futures]
+        except BaseException:
+            shutil.rmtree(slices_dir, ignore_errors=True)
+            raise
+
+        if header is not None:
+            if manifest.get("schema"):
+                manifest["has_header"] = False
+            else:
+                manifest["columns"] = header
+                manifest.pop("has_header", None)
+
+        self._replace_table(table_path, slices_dir, manifest_path, manifest)
+        return CompactionResult(table_path.name, size, sum(compressed_sizes), len(ranges))
+
+    @staticmethod
+    def _replace_table(table_path: Path, slices_dir: Path, manifest_path: Path, manifest: dict) -> None:
+        """
+        Swap the original table for the sliced folder of the same name together with its manifest.
+        The original is kept as a backup until both are in place, so that a failure leaves the table untouched.
+        """
+        tmp_manifest_path = manifest_path.with_name(f".{manifest_path.name}.tmp")
+        backup_path = table_path.with_name(f".{table_path.name}.original")
+        try:
+            with open(tmp_manifest_path, "w") as f:
+                json.dump(manifest, f)
+            table_path.rename(backup_path)
+            slices_dir.rename(table_path)
+            os.replace(tmp_manifest_path, manifest_path)
+        except BaseException:
+            if backup_path.exists():
+                if table_path.is_dir():
+                    shutil.rmtree(table_path)
+                backup_path.rename(table_path)
+            shutil.rmtree(slices_dir, ignore_errors=True)
+            tmp_manifest_path.unlink(missing_ok=True)
+            raise
+
+        backup_path.unlink()
+
+    def _compress_range(self, source: Path, start: int, end: int, destination: Path) -> int:
+        with open(source, "rb") as src, gzip.open(destination, "wb", compresslevel=self.cfg.compression_level) as dst:
+            src.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = src.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                dst.write(chunk)
+                remaining -= len(chunk)
+        return destination.stat().st_size
+
+    @staticmethod
+    def _record_boundaries(file_path: Path, start: int, step: int, enclosure: str) -> Iterator[int]:
+        """
+        Yield byte offsets right after the first record end found at least `step` bytes past the previous one.
+
+        A newline ends a record only when it is not enclosed in quotes. Escaped quotes are doubled in CSV,
+        so tracking the parity of the enclosure characters seen so far is enough. The `start` offset has to
+        point to a record start.
+        """
+        quote = enclosure.encode()
+        in_quotes = False
+        target = start + step
+        offset = start
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            while chunk := f.read(READ_CHUNK_SIZE):
+                scanned = 0  # quote state is known up to this index of the chunk
+                while offset + len(chunk) > target:
+                    newline = chunk.find(b"\n", max(target - offset, scanned))
+                    if newline == -1:
+                        break
+                    if quote:
+                        in_quotes ^= chunk.count(quote, scanned, newline) % 2 == 1
+                    scanned = newline + 1
+                    if not in_quotes:
+                        yield offset + scanned
+                        target = offset + scanned + step
+                if quote:
+                    in_quotes ^= chunk.count(quote, scanned) % 2 == 1
+                offset += len(chunk)
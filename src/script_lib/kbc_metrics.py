@@ -0,0 +1,150 @@
+"""
+Client for reporting metrics from the user script to the component, bypassing stdout and the event log.
+
+The component aggregates the received values and logs periodic snapshots and a summary when the script finishes.
+When the script runs outside the component, all calls are no-ops.
+
+Usage:
+    from kbc_metrics import metrics
+
+    metrics.incr("rows_processed", 100)
+    metrics.gauge("queue_size", 42)
+    with metrics.timer("api_call"):
+        ...
+
+The values are sent as StatsD-like lines (`name:value|c`, `name:value|g`, `name:value|ms`) in batches
+over a Unix datagram socket, whose path is passed in the KBC_METRICS_SOCKET environment variable.
+The batches are flushed by a background thread at least every second. Sending never blocks the script:
+when the component cannot keep up, the batch is dropped and counted in the `kbc_metrics.dropped` counter.
+
+Worker processes (e.g. `multiprocessing.Pool`) can report metrics too. Forked children start with an empty
+buffer, and workers flush their buffer when they finish or get terminated by the pool.
+"""
+
+import atexit
+import multiprocessing
+import multiprocessing.util
+import os
+import signal
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_SOCKET_ENV = "KBC_METRICS_SOCKET"
+MAX_BUFFER_SIZE = 8192
+FLUSH_INTERVAL = 1.0
+
+
+class Metrics:
+    def __init__(self, socket_path: str | None = None):
+        self._socket_path = socket_path or os.environ.get(METRICS_SOCKET_ENV)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) if self._socket_path else None
+        self._buffer: list[str] = []
+        self._buffer_size = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._dropped = 0
+        self._flush_thread: threading.Thread | None = None
+        atexit.register(self.flush)
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Increase the counter by the given value."""
+        self._add_line(f"{name}:{value}|c")
+
+    def gauge(self, name: str, value: float) -> None:
+        """Set the current value of the gauge."""
+        self._add_line(f"{name}:{value}|g")
+
+    def timing(self, name: str, milliseconds: float) -> None:
+        """Record a single duration of the timer."""
+        self._add_line(f"{name}:{milliseconds}|ms")
+
+    @contextmanager
+    def timer(self, name: str):
+        """Record the duration of the enclosed block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name, (time.perf_counter() - started) * 1000)
+
+    def flush(self) -> None:
+        """Send the buffered values right away."""
+        with self._lock:
+            self._flush_unlocked()
+
+    def _add_line(self, line: str) -> None:
+        if self._socket is None:
+            return
+        with self._lock:
+            if self._flush_thread is None:
+                self._start_process_hooks()
+            self._buffer.append(line.replace("\n", " "))
+            self._buffer_size += len(line) + 1
+            if self._buffer_size >= MAX_BUFFER_SIZE or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._flush_unlocked()
+
+    def _start_process_hooks(self) -> None:
+        """Set up flushing for the process sending its first value (must hold lock)."""
+        self._flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flush_thread.start()
+
+        # multiprocessing workers exit without running atexit handlers or are terminated by the pool
+        if multiprocessing.parent_process() is not None:
+            multiprocessing.util.Finalize(None, self.flush, exitpriority=0)
+            self._flush_on_sigterm()
+
+    def _flush_on_sigterm(self) -> None:
+        """Flush before the default SIGTERM action, e.g. when `multiprocessing.Pool` terminates its workers."""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if signal.getsignal(signal.SIGTERM) is not signal.SIG_DFL:
+            return
+
+        def handler(signum, _frame):
+            # the handler may interrupt the main thread while it holds the lock, never wait for it
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._flush_unlocked()
+                finally:
+                    self._lock.release()
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+        signal.signal(signal.SIGTERM, handler)
+
+    def _reset_after_fork(self) -> None:
+        """The child gets a copy of the parent's buffer and lock, but not of the flush thread."""
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffer_size = 0
+        self._dropped = 0
+        self._last_flush = time.monotonic()
+        self._flush_thread = None
+
+    def _flush_periodically(self) -> None:
+        """Send values of a script that went quiet, so that they show up in the periodic snapshots."""
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def _flush_unlocked(self) -> None:
+        if not self._buffer:
+            return
+        lines = self._buffer
+        self._buffer = []
+        self._buffer_size = 0
+        self._last_flush = time.monotonic()
+        if self._dropped:
+            lines.append(f"kbc_metrics.dropped:{self._dropped}|c")
+        try:
+            self._socket.sendto("\n".join(lines).encode(), socket.MSG_DONTWAIT, self._socket_path)
+            self._dropped = 0
+        except OSError:
+            # metrics are best effort, they must never block or break the script (e.g. when the queue is full)
+            self._dropped += len(lines) - (1 if self._dropped else 0)
+
+
+metrics = Metrics()
@@ -1,7 +1,10 @@
 import logging
 import os
+import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -34,6 +37,10 @@ class GitHandler:
         # do not ask for credentials when git authentication fails
         self.env["GIT_TERMINAL_PROMPT"] = "0"
 
+        # never download LFS objects during checkout – they are fetched selectively after the clone if enabled,
+        # see _fetch_lfs_objects, otherwise the repository keeps the pointer files
+        self.env["GIT_LFS_SKIP_SMUDGE"] = "1"
+
     def _set_up_token_auth(self) -> None:
         if not self.git_cfg.encrypted_token:
             raise UserException("No personal access token provided")
@@ -131,6 +138,11 @@ class GitHandler:
                 return Path()
 
             source_dir = Path.cwd() / GitHandler.REPO_PATH
+            if self.git_cfg.submodules:
+                self._fetch_submodules(source_dir)
+            if self.git_cfg.lfs:
+                self._fetch_lfs_objects(source_dir)
+
             main_script_path = Path(source_dir) / self.git_cfg.filename
             if not main_script_path.is_file():
                 raise UserException(f"Main script file '{self.git_cfg.filename}' not found in repository")
@@ -140,6 +152,105 @@ class GitHandler:
         except Exception as e:
             raise UserException(f"Error processing git repository: {str(e)}") from e
 
+    def _fetch_submodules(self, repo_path: Path) -> None:
+        """
+        Fetch all submodules in parallel, each one shallow if the server allows fetching the pinned commit.
+        The credentials are shared with the main repository (.netrc for PAT, GIT_SSH_COMMAND for SSH).
+        """
+        submodules = self._list_submodules(repo_path)
+        if not submodules:
+            logging.info("No submodules found in repository")
+            return
+
+        logging.info("Fetching %d submodule(s)...", len(submodules))
+        # registering the submodules writes into .git/config, so it cannot run in parallel
+        self._run_git(["git", "submodule", "init"], repo_path, "Failed to initialize submodules")
+
+        def fetch(name: str, path: str) -> None:
+            started = time.monotonic()
+            # --init is needed for the nested submodules, the top level ones are already registered
+            update_args = ["git", "submodule", "update", "--init", "--recursive"]
+            try:
+                self._run_git([*update_args, "--depth", "1", "--", path], repo_path, "Shallow fetch failed")
+            except UserException:
+                logging.info("Shallow fetch of submodule %s not possible, fetching full history.", path)
+                # a plain update would reuse the shallow clone left behind and fail again, so start over
+                shutil.rmtree(repo_path / ".git" / "modules" / name, ignore_errors=True)
+                shutil.rmtree(repo_path / path, ignore_errors=True)
+                self._run_git([*update_args, "--", path], repo_path, f"Failed to fetch submodule {path}")
+            logging.info(
+                "Submodule %s fetched in %.1f s (%.1f MB).",
+                path,
+                time.monotonic() - started,
+                self._dir_size(repo_path / ".git" / "modules" / name) / 1024 / 1024,
+            )
+
+        with ThreadPoolExecutor(max_workers=max(self.git_cfg.submodule_jobs, 1)) as executor:
+            futures = [executor.submit(fetch, name, path) for name, path in submodules]
+            for future in futures:
+                future.result()
+
+    def _list_submodules(self, repo_path: Path) -> list[tuple[str, str]]:
+        """Returns (name, path) pairs of the submodules declared in .gitmodules."""
+        if not (repo_path / ".gitmodules").is_file():
+            return []
+
+        stdout = self._run_git(
+            ["git", "config", "--file", ".gitmodules", "--get-regexp", r"^submodule\..*\.path$"],
+            repo_path,
+            "Failed to read .gitmodules",
+        )
+        submodules = []
+        for line in stdout.splitlines():
+            key, _, path = line.partition(" ")
+            submodules.append((key[len("submodule.") : -len(".path")], path))
+        return submodules
+
+    def _fetch_lfs_objects(self, repo_path: Path) -> None:
+        """
+        Fetch LFS objects only for the configured include/exclude patterns, one pull per include pattern
+        so that the time and size can be reported for each of them.
+        """
+        transfers_args = ["-c", f"lfs.concurrenttransfers={max(self.git_cfg.lfs_concurrent_transfers, 1)}"]
+        exclude_args = ["--exclude", ",".join(self.git_cfg.lfs_exclude)] if self.git_cfg.lfs_exclude else []
+        lfs_objects_path = repo_path / ".git" / "lfs" / "objects"
+
+        for pattern in self.git_cfg.lfs_include or [None]:
+            include_args = ["--include", pattern] if pattern else []
+            size_before = self._dir_size(lfs_objects_path)
+            started = time.monotonic()
+            self._run_git(
+                ["git", *transfers_args, "lfs", "pull", *include_args, *exclude_args],
+                repo_path,
+                "Failed to fetch Git LFS objects (is git-lfs installed?)",
+            )
+            logging.info(
+                "LFS objects matching %s fetched in %.1f s (%.1f MB).",
+                pattern or "all paths",
+                time.monotonic() - started,
+                (self._dir_size(lfs_objects_path) - size_before) / 1024 / 1024,
+            )
+
+    def _run_git(self, args: list[str], cwd: Path, error_message: str) -> str:
+        process = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.env,
+            cwd=cwd,
+        )
+        stdout, stderr = process.communicate()
+
+        if process.returncode != 0:
+            raise UserException(f"{error_message}: {stderr.decode() if stderr else 'Unknown git error'}")
+        return stdout.decode()
+
+    @staticmethod
+    def _dir_size(path: Path) -> int:
+        if not path.is_dir():
+            return 0
+        return sum(f.stat().st_size for f in path.rglob("*") if f.is_file() and not f.is_symlink())
+
     def get_repository_branches(self):
         """
         Get a list of branches in the git repository.
@@ -1,12 +1,25 @@
+import gzip
+import json
 import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
+from pathlib import Path
 
 import mock
 from freezegun import freeze_time
 from keboola.component.exceptions import UserException
 
 from component import Component
-from configuration import Configuration
+from configuration import CacheConfiguration, Configuration, GitConfiguration, OutputCompactionConfiguration
+from home_cache import HomeCache
+from metrics_channel import MetricsAggregator, MetricsChannel
+from output_compactor import OutputCompactor
+from source_git import GitHandler
 
 
 class TestComponent(unittest.TestCase):
@@ -60,6 +73,331 @@ class TestConfigurationUserProperties(unittest.TestCase):
         self.assertIsInstance(config.user_properties, dict)
 
 
+@mock.patch("output_compactor.MB", 1)
+class TestOutputCompactor(unittest.TestCase):
+    """Test cases for slicing and compressing large output tables (sizes in bytes thanks to patched MB)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tables_path = Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _read_slices(self, table_path: Path) -> list[bytes]:
+        return [gzip.decompress(p.read_bytes()) for p in sorted(table_path.iterdir())]
+
+    def test_table_with_header_is_sliced_and_manifest_gets_columns(self):
+        rows = "".join(f'{i},"multi\nline ""{i}"""\n' for i in range(20))
+        table_path = self.tables_path / "table.csv"
+        table_path.write_text("id,text\n" + rows)
+
+        cfg = OutputCompactionConfiguration(enabled=True, min_size_mb=10, slice_size_mb=50)
+        results = OutputCompactor(self.tables_path, cfg).compact()
+
+        self.assertEqual(len(results), 1)
+        self.assertTrue(table_path.is_dir())
+        slices = self._read_slices(table_path)
+        self.assertGreater(len(slices), 1)
+        self.assertEqual(b"".join(slices).decode(), rows)
+        for part in slices:
+            self.assertTrue(part.endswith(b'"\n'))
+        manifest = json.loads((self.tables_path / "table.csv.manifest").read_text())
+        self.assertEqual(manifest["columns"], ["id", "text"])
+
+    def test_headless_table_keeps_manifest_columns(self):
+        rows = "".join(f"{i},x\n" for i in range(50))
+        (self.tables_path / "table.csv").write_text(rows)
+        manifest = {"columns": ["a", "b"], "incremental": True}
+        (self.tables_path / "table.csv.manifest").write_text(json.dumps(manifest))
+
+        cfg = OutputCompactionConfiguration(enabled=True, min_size_mb=10, slice_size_mb=40)
+        OutputCompactor(self.tables_path, cfg).compact()
+
+        self.assertEqual(b"".join(self._read_slices(self.tables_path / "table.csv")).decode(), rows)
+        self.assertEqual(json.loads((self.tables_path / "table.csv.manifest").read_text()), manifest)
+
+    def test_failed_swap_restores_original_table(self):
+        content = "id\n" + "".join(f"{i}\n" for i in range(50))
+        (self.tables_path / "table.csv").write_text(content)
+        manifest = {"incremental": True}
+        (self.tables_path / "table.csv.manifest").write_text(json.dumps(manifest))
+
+        cfg = OutputCompactionConfiguration(enabled=True, min_size_mb=10, slice_size_mb=40)
+        with mock.patch("output_compactor.os.replace", side_effect=OSError("disk full")):
+            with self.assertLogs(level="INFO") as logs:
+                self.assertEqual(OutputCompactor(self.tables_path, cfg).compact(), [])
+
+        self.assertIn("0 table(s) compacted, 1 failed", logs.output[-1])
+
+        self.assertEqual((self.tables_path / "table.csv").read_text(), content)
+        self.assertEqual(json.loads((self.tables_path / "table.csv.manifest").read_text()), manifest)
+        self.assertEqual(sorted(p.name for p in self.tables_path.iterdir()), ["table.csv", "table.csv.manifest"])
+
+    def test_negative_max_workers_is_rejected(self):
+        with self.assertRaises(UserException):
+            OutputCompactionConfiguration(max_workers=-1)
+
+    def test_small_table_is_left_untouched(self):
+        (self.tables_path / "table.csv").write_text("id\n1\n")
+
+        cfg = OutputCompactionConfiguration(enabled=True, min_size_mb=1000)
+        self.assertEqual(OutputCompactor(self.tables_path, cfg).compact(), [])
+        self.assertTrue((self.tables_path / "table.csv").is_file())
+        self.assertFalse((self.tables_path / "table.csv.manifest").exists())
+
+
+class TestHomeCache(unittest.TestCase):
+    """Test cases for persisting $HOME cache directories between runs."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.tmp_dir.name) / "cache"
+        self.home_patcher = mock.patch("pathlib.Path.home", return_value=Path(self.tmp_dir.name) / "home")
+        self.home = self.home_patcher.start()
+        self.cfg = CacheConfiguration(enabled=True, path=str(self.cache_path), directories=["nltk_data"])
+
+    def tearDown(self):
+        self.home_patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def _run(self, cfg: CacheConfiguration, key: str = "1-2", content: dict[str, str] | None = None) -> HomeCache:
+        """Simulate a run starting with an empty $HOME, in which the script writes the given files."""
+        shutil.rmtree(self.home.return_value, ignore_errors=True)
+        cache = HomeCache(cfg, key)
+        cache.restore()
+        for rel_path, text in (content or {}).items():
+            file_path = self.home.return_value / rel_path
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(text)
+        cache.save()
+        return cache
+
+    def test_saved_directory_is_restored_in_next_run(self):
+        self._run(self.cfg, content={"nltk_data/corpora/words.txt": "hello"})
+        os.symlink("corpora/words.txt", self.home.return_value / "nltk_data" / "link.txt")
+        HomeCache(self.cfg, "1-2").save()
+
+        self._run(self.cfg)
+
+        restored = self.home.return_value / "nltk_data"
+        self.assertEqual((restored / "corpora" / "words.txt").read_text(), "hello")
+        self.assertEqual(os.readlink(restored / "link.txt"), "corpora/words.txt")
+
+    def test_corrupted_entry_is_discarded_entirely(self):
+        self._run(self.cfg, content={"nltk_data/a_config.json": "{}", "nltk_data/z_weights.bin": "weights"})
+        # corrupt the file restored last, so that the other one would already be in place
+        index = json.loads(next(self.cache_path.rglob("index.json")).read_text())
+        next(self.cache_path.rglob(list(index["files"])[-1])).write_text("tampered")
+
+        self._run(self.cfg)
+
+        self.assertEqual(list(self.home.return_value.rglob("*")), [])
+        self.assertEqual(list(self.cache_path.rglob("*.bin")), [])
+
+    @mock.patch("home_cache.MB", 1)
+    def test_least_recently_used_entry_of_the_configuration_is_evicted(self):
+        directories = ["nltk_data", "stanza_resources"]
+        cfg = CacheConfiguration(enabled=True, path=str(self.cache_path), directories=directories, max_size_mb=15)
+        self._run(cfg, key="other", content={"nltk_data/words.txt": "0123456789"})
+        self._run(cfg, key="1-2", content={"nltk_data/words.txt": "0123456789"})
+        self._run(cfg, key="1-2", content={"stanza_resources/model.pt": "9876543210"})
+
+        self.assertFalse((self.cache_path / "1-2" / "nltk_data").exists())
+        self.assertTrue((self.cache_path / "1-2" / "stanza_resources").exists())
+        self.assertTrue((self.cache_path / "other" / "nltk_data").exists())
+
+    def test_concurrent_saves_use_unique_temporary_entries(self):
+        cache = HomeCache(self.cfg, "1-2")
+        with mock.patch("home_cache.os.getpid", return_value=1):
+            self._run(self.cfg, content={"nltk_data/words.txt": "hello"})
+            (self.cache_path / "1-2" / "nltk_data.tmp-1").mkdir()
+            cache.save()
+
+        self.assertTrue((self.cache_path / "1-2" / "nltk_data.tmp-1").is_dir())
+
+    def test_non_positive_size_limit_is_rejected(self):
+        with self.assertRaises(UserException):
+            CacheConfiguration(max_size_mb=0)
+
+
+# local submodule URLs are blocked by git by default
+@mock.patch.dict(
+    os.environ,
+    {"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "protocol.file.allow", "GIT_CONFIG_VALUE_0": "always"},
+)
+class TestGitSubmodules(unittest.TestCase):
+    """Test cases for fetching submodules of the cloned repository."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def _git(*args: str) -> None:
+        identity = ["-c", "user.name=test", "-c", "user.email=test@example.com"]
+        subprocess.run(["git", *identity, *args], check=True, capture_output=True)
+
+    def test_nested_submodules_are_fetched(self):
+        for repo, file_name in (("inner", "inner.py"), ("lib", "lib.py"), ("app", "main.py")):
+            self._git("init", "-b", "main", repo)
+            Path(repo, file_name).write_text("print('hello')\n")
+            self._git("-C", repo, "add", ".")
+        self._git("-C", "inner", "commit", "-m", "inner")
+        self._git("-C", "lib", "submodule", "add", f"file://{os.getcwd()}/inner", "inner")
+        self._git("-C", "lib", "commit", "-m", "lib")
+        self._git("-C", "app", "submodule", "add", f"file://{os.getcwd()}/lib", "libs/lib")
+        self._git("-C", "app", "commit", "-m", "app")
+
+        git_cfg = GitConfiguration(url=f"file://{os.getcwd()}/app", submodules=True)
+        script_path = GitHandler(git_cfg).clone_repository()
+
+        self.assertEqual(script_path.name, "main.py")
+        self.assertTrue((Path(GitHandler.REPO_PATH) / "libs" / "lib" / "lib.py").is_file())
+        self.assertTrue((Path(GitHandler.REPO_PATH) / "libs" / "lib" / "inner" / "inner.py").is_file())
+
+
+    def test_submodule_pinned_to_unadvertised_commit_falls_back_to_full_fetch(self):
+        for repo, file_name in (("lib", "lib.py"), ("app", "main.py")):
+            self._git("init", "-b", "main", repo)
+            Path(repo, file_name).write_text("print('hello')\n")
+            self._git("-C", repo, "add", ".")
+        self._git("-C", "lib", "commit", "-m", "pinned")
+        self._git("-C", "app", "submodule", "add", f"file://{os.getcwd()}/lib", "libs/lib")
+        self._git("-C", "app", "commit", "-m", "app")
+        # move the branch tip away from the pinned commit
+        Path("lib", "lib.py").write_text("print('newer')\n")
+        self._git("-C", "lib", "commit", "-am", "newer")
+
+        # protocol v0 servers refuse to serve unadvertised commits, so the shallow fetch fails
+        env = {"GIT_CONFIG_COUNT": "2", "GIT_CONFIG_KEY_1": "protocol.version", "GIT_CONFIG_VALUE_1": "0"}
+        with mock.patch.dict(os.environ, env):
+            git_cfg = GitConfiguration(url=f"file://{os.getcwd()}/app", submodules=True)
+            GitHandler(git_cfg).clone_repository()
+
+        self.assertEqual((Path(GitHandler.REPO_PATH) / "libs" / "lib" / "lib.py").read_text(), "print('hello')\n")
+
+class TestGitLfs(unittest.TestCase):
+    """Test cases for selective fetching of Git LFS objects."""
+
+    def _pull_args(self, **lfs_cfg) -> list[list[str]]:
+        git_cfg = GitConfiguration(url="https://example.com/repo.git", lfs=True, **lfs_cfg)
+        handler = GitHandler(git_cfg)
+        with mock.patch.object(handler, "_run_git", return_value="") as run_git:
+            handler._fetch_lfs_objects(Path("repo"))
+        return [c.args[0] for c in run_git.call_args_list]
+
+    def test_one_pull_per_include_pattern_with_excludes(self):
+        calls = self._pull_args(lfs_include=["data/*.csv", "models/**"], lfs_exclude=["*.bak", "tmp/**"])
+
+        self.assertEqual(
+            calls,
+            [
+                ["git", "-c", "lfs.concurrenttransfers=8", "lfs", "pull", "--include", "data/*.csv",
+                 "--exclude", "*.bak,tmp/**"],
+                ["git", "-c", "lfs.concurrenttransfers=8", "lfs", "pull", "--include", "models/**",
+                 "--exclude", "*.bak,tmp/**"],
+            ],
+        )
+
+    def test_single_pull_without_patterns(self):
+        calls = self._pull_args(lfs_concurrent_transfers=3)
+
+        self.assertEqual(calls, [["git", "-c", "lfs.concurrenttransfers=3", "lfs", "pull"]])
+
+    def test_smudge_is_skipped_during_clone(self):
+        handler = GitHandler(GitConfiguration(url="https://example.com/repo.git"))
+
+        self.assertEqual(handler.env["GIT_LFS_SKIP_SMUDGE"], "1")
+
+
+class TestMetricsChannel(unittest.TestCase):
+    """Test cases for the metrics side channel between the user script and the component."""
+
+    @classmethod
+    def setUpClass(cls):
+        sys.path.append(str(Path(__file__).parent.parent / "src" / "script_lib"))
+
+    def test_aggregator_aggregates_values_by_type(self):
+        aggregator = MetricsAggregator()
+        aggregator.add_payload("rows:10|c\nrows:5|c\nqueue:3|g\nqueue:1|g\napi:10|ms\napi:30|ms\ninvalid\nx:y|c")
+
+        snapshot = aggregator.snapshot()
+        self.assertEqual(snapshot["counters"], {"rows": 15})
+        self.assertEqual(snapshot["gauges"], {"queue": {"last": 1, "min": 1, "max": 3}})
+        self.assertEqual(snapshot["timers"]["api"], {"count": 2, "sum": 40, "min": 10, "max": 30, "avg": 20})
+        self.assertEqual(snapshot["dropped"], 2)
+
+    def test_script_metrics_are_received(self):
+        script = (
+            "from kbc_metrics import metrics\n"
+            "for _ in range(10000):\n"
+            "    metrics.incr('rows')\n"
+            "with metrics.timer('step'):\n"
+            "    metrics.gauge('queue', 7)\n"
+        )
+        with MetricsChannel() as channel:
+            subprocess.run([sys.executable, "-c", script], check=True)
+
+        snapshot = channel.aggregator.snapshot()
+        self.assertEqual(snapshot["counters"], {"rows": 10000})
+        self.assertEqual(snapshot["gauges"]["queue"]["last"], 7)
+        self.assertEqual(snapshot["timers"]["step"]["count"], 1)
+        self.assertNotIn("KBC_METRICS_SOCKET", os.environ)
+
+    def test_client_does_not_block_when_receiver_falls_behind(self):
+        from kbc_metrics import Metrics
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            socket_path = os.path.join(tmp_dir, "metrics.sock")
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(socket_path)
+            client = Metrics(socket_path)
+            with mock.patch("kbc_metrics.MAX_BUFFER_SIZE", 1):
+                for _ in range(50000):
+                    client.incr("rows")
+            receiver.close()
+
+        self.assertGreater(client._dropped, 0)
+
+    def test_client_flushes_quiet_script_in_background(self):
+        from kbc_metrics import Metrics
+
+        with MetricsChannel() as channel:
+            with mock.patch("kbc_metrics.FLUSH_INTERVAL", 0.05):
+                client = Metrics(channel.socket_path)
+                client.gauge("queue", 7)
+                time.sleep(0.3)
+            self.assertEqual(channel.aggregator.gauges["queue"]["last"], 7)
+
+    def test_pool_worker_metrics_are_received(self):
+        script = (
+            "import multiprocessing\n"
+            "import sys\n"
+            "from kbc_metrics import metrics\n"
+            "def work(rows):\n"
+            "    for _ in range(rows):\n"
+            "        metrics.incr('rows')\n"
+            "if __name__ == '__main__':\n"
+            "    metrics.incr('rows', 0.5)  # unsent value must not be copied into the forked workers\n"
+            "    with multiprocessing.get_context(sys.argv[1]).Pool(4) as pool:\n"
+            "        pool.map(work, [200] * 4)\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script_path = Path(tmp_dir) / "script.py"
+            script_path.write_text(script)
+            for method in ("fork", "spawn"):
+                with self.subTest(method=method):
+                    with MetricsChannel() as channel:
+                        subprocess.run([sys.executable, str(script_path), method], check=True)
+                    self.assertEqual(channel.aggregator.snapshot()["counters"], {"rows": 800.5})
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()